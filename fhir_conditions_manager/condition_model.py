@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import sys
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
@@ -16,6 +17,12 @@ QUALITY_FLAG_METADATA: dict[str, dict[str, str]] = {
     "missing_icd10":           {"severity": "low",    "description": "No ICD-10 code, SNOMED only"},
 }
 
+FLAG_BITS: dict[str, int] = {name: 1 << i for i, name in enumerate(QUALITY_FLAG_METADATA)}
+
+
+def flag_names(mask: int) -> list[str]:
+    return [name for name, bit in FLAG_BITS.items() if mask & bit]
+
 
 class FhirCoding(BaseModel):
     system: Optional[str] = None
@@ -70,6 +77,23 @@ SNOMED_SYSTEM = "http://snomed.info/sct"
 ICD9_SYSTEM = "http://terminology.hl7.org/CodeSystem/ICD-9CM-diagnosiscodes"
 IMO_SYSTEM = "http://terminology.hl7.org/CodeSystem-IMO.html"
 
+ICD10_LABEL = sys.intern("ICD-10")
+SNOMED_LABEL = sys.intern("SNOMED")
+ICD9_LABEL = sys.intern("ICD-9")
+IMO_LABEL = sys.intern("IMO")
+
+
+def _pick_canonical_code(
+    icd10: set[str], snomed: set[str], icd9: set[str], display_name: str
+) -> tuple[str, str]:
+    if icd10:
+        return min(icd10), ICD10_LABEL
+    if snomed:
+        return min(snomed), SNOMED_LABEL
+    if icd9:
+        return min(icd9), ICD9_LABEL
+    return display_name.lower(), "text"
+
 
 @dataclass
 class ConditionRecord:
@@ -80,7 +104,7 @@ class ConditionRecord:
     snomed_codes: set[str] = field(default_factory=set)
     icd9_codes: set[str] = field(default_factory=set)
     imo_codes: set[str] = field(default_factory=set)
-    all_codes: set[str] = field(default_factory=set)
+    all_codes: frozenset[str] = frozenset()
 
     normalized_status: str = "unknown"
     searchable_text: str = ""
@@ -89,7 +113,7 @@ class ConditionRecord:
     onset_start: Optional[datetime] = None
     onset_end: Optional[datetime] = None
 
-    quality_flags: list[str] = field(default_factory=list)
+    quality_flags: int = 0
 
     derived_from_ids: list[str] = field(default_factory=list)
 
@@ -98,3 +122,18 @@ class ConditionRecord:
     removal_timestamp: Optional[datetime] = None
 
     ingestion_batch: Optional[int] = None
+
+    canonical_code: tuple[str, str] = field(init=False, repr=False, compare=False)
+    onset_start_date: Optional[str] = field(init=False, repr=False, compare=False)
+    onset_period: Optional[tuple[str, str]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.normalized_status = sys.intern(self.normalized_status)
+        # The store's token index and search both expect lowercase text.
+        self.searchable_text = self.searchable_text.lower()
+        self.canonical_code = _pick_canonical_code(
+            self.icd10_codes, self.snomed_codes, self.icd9_codes, self.display_name
+        )
+        start, end = self.onset_start, self.onset_end
+        self.onset_start_date = start.isoformat()[:10] if start else None
+        self.onset_period = (start.isoformat(), end.isoformat()) if start and end else None
@@ -1,63 +1,202 @@
 from __future__ import annotations
 
 import threading
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Iterator, Optional
+from typing import Iterator, Optional, Sequence
 
 from .condition_model import ConditionRecord
 
 
+def _discard_posting(index: dict[str, set[str]], key: str, resource_id: str) -> None:
+    postings = index.get(key)
+    if postings is None:
+        return
+    postings.discard(resource_id)
+    if not postings:
+        del index[key]
+
+
+class RWLock:
+
+    def __init__(self) -> None:
+        self._readers = 0
+        self._readers_lock = threading.Lock()
+        self._writer_lock = threading.Lock()
+        # Held by a waiting writer so new readers queue behind it instead of
+        # keeping the reader count above zero indefinitely.
+        self._writer_gate = threading.Lock()
+
+    @contextmanager
+    def gen_rlock(self) -> Iterator[None]:
+        with self._writer_gate, self._readers_lock:
+            self._readers += 1
+            if self._readers == 1:
+                self._writer_lock.acquire()
+        try:
+            yield
+        finally:
+            with self._readers_lock:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._writer_lock.release()
+
+    @contextmanager
+    def gen_wlock(self) -> Iterator[None]:
+        with self._writer_gate:
+            self._writer_lock.acquire()
+        try:
+            yield
+        finally:
+            self._writer_lock.release()
+
+
 class ConditionStore:
 
     def __init__(self) -> None:
         self._records: dict[str, ConditionRecord] = {}
-        self._lock = threading.RLock()
+        self._active: dict[str, ConditionRecord] = {}
+        self._seq: dict[str, int] = {}
+        self._by_code: dict[str, set[str]] = {}
+        self._by_token: dict[str, set[str]] = {}
+        self._by_status: dict[str, set[str]] = {}
+        self._snapshot: Optional[tuple[ConditionRecord, ...]] = None
+        self._active_cache: Optional[tuple[ConditionRecord, ...]] = None
+        self._rw = RWLock()
 
     def add(self, record: ConditionRecord) -> bool:
-        with self._lock:
+        with self._rw.gen_wlock():
             if record.resource_id in self._records:
                 return False
+            self._seq[record.resource_id] = len(self._records)
             self._records[record.resource_id] = record
+            self._snapshot = None
+            if not record.is_removed:
+                self._active[record.resource_id] = record
+                self._active_cache = None
+                self._index(record)
             return True
 
     def get_by_id(self, resource_id: str) -> Optional[ConditionRecord]:
-        with self._lock:
+        with self._rw.gen_rlock():
             return self._records.get(resource_id)
 
-    def get_all_active(self) -> list[ConditionRecord]:
-        with self._lock:
-            return [r for r in self._records.values() if not r.is_removed]
+    def get_all_active(self) -> tuple[ConditionRecord, ...]:
+        with self._rw.gen_rlock():
+            return self._active_records()
 
     def get_all_removed(self) -> list[ConditionRecord]:
-        with self._lock:
+        with self._rw.gen_rlock():
             return [r for r in self._records.values() if r.is_removed]
 
     def soft_remove(self, resource_id: str, reason: str) -> bool:
-        with self._lock:
+        with self._rw.gen_wlock():
             record = self._records.get(resource_id)
             if record is None or record.is_removed:
                 return False
             record.is_removed = True
             record.removal_reason = reason
             record.removal_timestamp = datetime.now(timezone.utc)
+            del self._active[resource_id]
+            self._active_cache = None
+            self._unindex(record)
             return True
 
+    def lookup_by_code(self, code: str) -> list[ConditionRecord]:
+        with self._rw.gen_rlock():
+            return self._materialize(self._by_code.get(code, set()))
+
+    def lookup_by_token(self, token: str) -> list[ConditionRecord]:
+        with self._rw.gen_rlock():
+            return self._materialize(self._by_token.get(token.lower(), set()))
+
+    def lookup_by_text(self, text: str) -> Sequence[ConditionRecord]:
+        return self.search(text=text)
+
+    def search(
+        self,
+        text: Optional[str] = None,
+        code: Optional[str] = None,
+        status: Optional[str] = None,
+    ) -> Sequence[ConditionRecord]:
+        needle = text.lower() if text else None
+        with self._rw.gen_rlock():
+            ids: Optional[set[str]] = None
+            if code:
+                ids = self._by_code.get(code, set())
+            if status:
+                status_ids = self._by_status.get(status.lower(), set())
+                ids = status_ids if ids is None else ids & status_ids
+            if needle is not None and (ids is None or ids):
+                text_ids = self._text_candidates(needle)
+                if text_ids is not None:
+                    ids = text_ids if ids is None else ids & text_ids
+            candidates = self._active_records() if ids is None else self._materialize(ids)
+        if needle is None:
+            return candidates
+        return [r for r in candidates if needle in r.searchable_text]
+
     def iterate(self) -> Iterator[ConditionRecord]:
-        with self._lock:
-            records = list(self._records.values())
-        yield from records
+        # Soft removal mutates records in place, so only add() invalidates
+        # the snapshot; readers rebuild it lazily and then share it lock-free.
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._rw.gen_rlock():
+                snapshot = self._snapshot = tuple(self._records.values())
+        yield from snapshot
+
+    def _active_records(self) -> tuple[ConditionRecord, ...]:
+        # Read-lock held by the caller; rebuilt only after add/soft_remove.
+        cached = self._active_cache
+        if cached is None:
+            cached = self._active_cache = tuple(self._active.values())
+        return cached
+
+    def _index(self, record: ConditionRecord) -> None:
+        self._by_status.setdefault(record.normalized_status, set()).add(record.resource_id)
+        for code in record.all_codes:
+            self._by_code.setdefault(code, set()).add(record.resource_id)
+        for token in set(record.searchable_text.split()):
+            self._by_token.setdefault(token, set()).add(record.resource_id)
+
+    def _unindex(self, record: ConditionRecord) -> None:
+        _discard_posting(self._by_status, record.normalized_status, record.resource_id)
+        for code in record.all_codes:
+            _discard_posting(self._by_code, code, record.resource_id)
+        for token in set(record.searchable_text.split()):
+            _discard_posting(self._by_token, token, record.resource_id)
+
+    def _text_candidates(self, needle: str) -> Optional[set[str]]:
+        # Each whitespace-free fragment of a substring query must fall inside a
+        # single indexed token, so scanning the vocabulary narrows candidates.
+        fragments = set(needle.split())
+        if not fragments:
+            return None
+        candidates: Optional[set[str]] = None
+        for fragment in sorted(fragments, key=len, reverse=True):
+            ids: set[str] = set()
+            for token, postings in self._by_token.items():
+                if fragment in token:
+                    ids |= postings
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+        return candidates
+
+    def _materialize(self, ids: set[str]) -> list[ConditionRecord]:
+        return [self._records[i] for i in sorted(ids, key=self._seq.__getitem__)]
 
     @property
     def total_count(self) -> int:
-        with self._lock:
+        with self._rw.gen_rlock():
             return len(self._records)
 
     @property
     def active_count(self) -> int:
-        with self._lock:
-            return sum(1 for r in self._records.values() if not r.is_removed)
+        with self._rw.gen_rlock():
+            return len(self._active)
 
     @property
     def removed_count(self) -> int:
-        with self._lock:
-            return sum(1 for r in self._records.values() if r.is_removed)
+        with self._rw.gen_rlock():
+            return len(self._records) - len(self._active)
@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import logging
 from dataclasses import dataclass, field
-from typing import Any
+from typing import Any, Sequence
 
-from .condition_model import ConditionRecord
+from .condition_model import FLAG_BITS, ConditionRecord
 from .condition_store import ConditionStore
 from .monitoring import MonitoringDashboard
 
@@ -19,6 +19,10 @@ class RemovalPredicate:
     icd10_codes: set[str] = field(default_factory=set)
     snomed_codes: set[str] = field(default_factory=set)
     quality_flags: list[str] = field(default_factory=list)
+    _flag_mask: int = field(init=False, default=0, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._flag_mask = sum(FLAG_BITS[f] for f in set(self.quality_flags))
 
 
 PREDICATES: dict[str, RemovalPredicate] = {
@@ -38,17 +42,14 @@ PREDICATES: dict[str, RemovalPredicate] = {
 
 
 def _matches_predicate(record: ConditionRecord, pred: RemovalPredicate) -> bool:
-    for pattern in pred.text_patterns:
-        if pattern in record.searchable_text:
-            return True
+    text = record.searchable_text
+    if any(pattern in text for pattern in pred.text_patterns):
+        return True
     if pred.icd10_codes and record.icd10_codes & pred.icd10_codes:
         return True
     if pred.snomed_codes and record.snomed_codes & pred.snomed_codes:
         return True
-    for flag in pred.quality_flags:
-        if flag in record.quality_flags:
-            return True
-    return False
+    return bool(record.quality_flags & pred._flag_mask)
 
 
 class CorrectionEngine:
@@ -58,12 +59,11 @@ class CorrectionEngine:
         self.dashboard = dashboard
 
     def remove_by_text(self, target: str, reason: str) -> dict[str, Any]:
-        target_lower = target.lower()
-        matched = [r for r in self.store.get_all_active() if target_lower in r.searchable_text]
+        matched = self.store.lookup_by_text(target)
         return self._apply_removals(matched, "remove_by_text", target, reason)
 
     def remove_by_code(self, code: str, reason: str) -> dict[str, Any]:
-        matched = [r for r in self.store.get_all_active() if code in r.all_codes]
+        matched = self.store.lookup_by_code(code)
         return self._apply_removals(matched, "remove_by_code", code, reason)
 
     def remove_by_id(self, resource_id: str, reason: str) -> dict[str, Any]:
@@ -115,7 +115,7 @@ class CorrectionEngine:
 
     def _apply_removals(
         self,
-        matched: list[ConditionRecord],
+        matched: Sequence[ConditionRecord],
         action: str,
         target: str,
         reason: str,
@@ -2,25 +2,32 @@ from __future__ import annotations
 
 import logging
 import random
+import sys
+from collections import Counter
 from datetime import datetime
 from typing import Any
 
 from .condition_model import (
+    FLAG_BITS,
     ICD10_SYSTEM,
     ICD9_SYSTEM,
     IMO_SYSTEM,
     SNOMED_SYSTEM,
     ConditionRecord,
     FhirCondition,
+    flag_names,
 )
 from .condition_store import ConditionStore
 from .monitoring import BatchMetrics, MonitoringDashboard
 
 logger = logging.getLogger("fhir_conditions_manager.ingestion")
 
-ADMIN_CODE_INDICATORS = {"admin code", "*new member", "prompt authorization"}
+ADMIN_CODE_INDICATORS = frozenset({"admin code", "*new member", "prompt authorization"})
 
-VAGUE_ENTRY_KEYWORDS = {"encounter for", "elective procedure", "initial encounter"}
+VAGUE_ENTRY_KEYWORDS = frozenset({"encounter for", "elective procedure", "initial encounter"})
+
+_ADMIN_PATTERNS = tuple(ADMIN_CODE_INDICATORS)
+_VAGUE_PATTERNS = tuple(VAGUE_ENTRY_KEYWORDS)
 
 CLINICAL_STATUS_NORMALIZATION = {
     "active": "active",
@@ -28,21 +35,43 @@ CLINICAL_STATUS_NORMALIZATION = {
     "resolved": "resolved",
 }
 
+CodeScan = tuple[set[str], set[str], set[str], set[str], set[str], str, str]
+
 
-def _extract_codes_by_system(condition: FhirCondition) -> dict[str, set[str]]:
-    codes: dict[str, set[str]] = {
-        ICD10_SYSTEM: set(),
-        SNOMED_SYSTEM: set(),
-        ICD9_SYSTEM: set(),
-        IMO_SYSTEM: set(),
-    }
+def _scan_code_concept(condition: FhirCondition) -> CodeScan:
+    icd10: set[str] = set()
+    snomed: set[str] = set()
+    icd9: set[str] = set()
+    imo: set[str] = set()
     all_codes: set[str] = set()
-    if condition.code:
-        for coding in condition.code.coding:
-            if coding.code and coding.system:
-                codes.setdefault(coding.system, set()).add(coding.code)
-                all_codes.add(coding.code)
-    return {**codes, "_all": all_codes}
+    parts: list[str] = []
+    display_name: str | None = None
+    concept = condition.code
+    if concept:
+        if concept.text:
+            parts.append(concept.text)
+            display_name = concept.text
+        for coding in concept.coding:
+            if coding.display:
+                parts.append(coding.display)
+                if display_name is None:
+                    display_name = coding.display
+            if coding.code:
+                parts.append(coding.code)
+                system = coding.system
+                if system:
+                    code = sys.intern(coding.code)
+                    if system == ICD10_SYSTEM:
+                        icd10.add(code)
+                    elif system == SNOMED_SYSTEM:
+                        snomed.add(code)
+                    elif system == ICD9_SYSTEM:
+                        icd9.add(code)
+                    elif system == IMO_SYSTEM:
+                        imo.add(code)
+                    all_codes.add(code)
+    searchable = " ".join(parts).lower()
+    return icd10, snomed, icd9, imo, all_codes, searchable, display_name or "Unknown condition"
 
 
 def _normalize_clinical_status(condition: FhirCondition) -> str:
@@ -52,27 +81,13 @@ def _normalize_clinical_status(condition: FhirCondition) -> str:
     return CLINICAL_STATUS_NORMALIZATION.get(raw, raw or "unknown")
 
 
-def _build_searchable_text(condition: FhirCondition) -> str:
-    parts: list[str] = []
-    if condition.code:
-        if condition.code.text:
-            parts.append(condition.code.text)
-        for coding in condition.code.coding:
-            if coding.display:
-                parts.append(coding.display)
-            if coding.code:
-                parts.append(coding.code)
-    return " ".join(parts).lower()
-
-
-def _pick_display_name(condition: FhirCondition) -> str:
-    if condition.code and condition.code.text:
-        return condition.code.text
-    if condition.code:
-        for coding in condition.code.coding:
-            if coding.display:
-                return coding.display
-    return "Unknown condition"
+def _parse_fhir_datetime(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
 
 
 def _parse_onset_dates(
@@ -80,49 +95,41 @@ def _parse_onset_dates(
 ) -> tuple[datetime | None, datetime | None]:
     if condition.onsetPeriod is None:
         return None, None
-    start = end = None
-    if condition.onsetPeriod.start:
-        try:
-            start = datetime.fromisoformat(condition.onsetPeriod.start)
-        except ValueError:
-            pass
-    if condition.onsetPeriod.end:
-        try:
-            end = datetime.fromisoformat(condition.onsetPeriod.end)
-        except ValueError:
-            pass
-    return start, end
+    return (
+        _parse_fhir_datetime(condition.onsetPeriod.start),
+        _parse_fhir_datetime(condition.onsetPeriod.end),
+    )
 
 
 def _detect_quality_flags(
     condition: FhirCondition,
-    code_sets: dict[str, set[str]],
+    icd10_codes: set[str],
     normalized_status: str,
     onset_start: datetime | None,
     onset_end: datetime | None,
-) -> list[str]:
-    flags: list[str] = []
-    searchable = _build_searchable_text(condition)
+    searchable: str,
+) -> int:
+    flags = 0
 
     if condition.clinicalStatus is None:
-        flags.append("missing_clinical_status")
+        flags |= FLAG_BITS["missing_clinical_status"]
 
     has_end_date = onset_end is not None
     if normalized_status == "active" and has_end_date:
-        flags.append("inconsistent_status")
+        flags |= FLAG_BITS["inconsistent_status"]
     elif normalized_status == "resolved" and not has_end_date:
-        flags.append("inconsistent_status")
+        flags |= FLAG_BITS["inconsistent_status"]
 
-    if any(indicator in searchable for indicator in ADMIN_CODE_INDICATORS):
-        flags.append("admin_code")
-    if any(keyword in searchable for keyword in VAGUE_ENTRY_KEYWORDS):
-        flags.append("vague_entry")
+    if any(indicator in searchable for indicator in _ADMIN_PATTERNS):
+        flags |= FLAG_BITS["admin_code"]
+    if any(keyword in searchable for keyword in _VAGUE_PATTERNS):
+        flags |= FLAG_BITS["vague_entry"]
     if onset_start and onset_end:
         duration = (onset_end - onset_start).total_seconds()
         if 0 < duration < 86400:
-            flags.append("short_duration")
-    if not code_sets.get(ICD10_SYSTEM):
-        flags.append("missing_icd10")
+            flags |= FLAG_BITS["short_duration"]
+    if not icd10_codes:
+        flags |= FLAG_BITS["missing_icd10"]
 
     return flags
 
@@ -146,25 +153,25 @@ def _extract_derived_from_ids(condition: FhirCondition) -> list[str]:
 
 def build_condition_record(raw: dict[str, Any], batch_number: int) -> ConditionRecord:
     condition = FhirCondition.model_validate(raw)
-    code_sets = _extract_codes_by_system(condition)
+    icd10, snomed, icd9, imo, all_codes, searchable, display_name = _scan_code_concept(condition)
     onset_start, onset_end = _parse_onset_dates(condition)
     normalized_status = _normalize_clinical_status(condition)
 
     return ConditionRecord(
         resource_id=condition.id,
         fhir_condition=condition,
-        icd10_codes=code_sets.get(ICD10_SYSTEM, set()),
-        snomed_codes=code_sets.get(SNOMED_SYSTEM, set()),
-        icd9_codes=code_sets.get(ICD9_SYSTEM, set()),
-        imo_codes=code_sets.get(IMO_SYSTEM, set()),
-        all_codes=code_sets.get("_all", set()),
+        icd10_codes=icd10,
+        snomed_codes=snomed,
+        icd9_codes=icd9,
+        imo_codes=imo,
+        all_codes=frozenset(all_codes),
         normalized_status=normalized_status,
-        searchable_text=_build_searchable_text(condition),
-        display_name=_pick_display_name(condition),
+        searchable_text=searchable,
+        display_name=display_name,
         onset_start=onset_start,
         onset_end=onset_end,
         quality_flags=_detect_quality_flags(
-            condition, code_sets, normalized_status, onset_start, onset_end
+            condition, icd10, normalized_status, onset_start, onset_end, searchable
         ),
         derived_from_ids=_extract_derived_from_ids(condition),
         ingestion_batch=batch_number,
@@ -178,7 +185,9 @@ def ingest_batch(
     dashboard: MonitoringDashboard,
 ) -> BatchMetrics:
     metrics = BatchMetrics(batch_number=batch_number, received=len(raw_conditions))
-    flag_counts: dict[str, int] = {}
+    flag_counts: Counter[str] = Counter()
+    duplicate_ids: list[str] = []
+    log_flags = logger.isEnabledFor(logging.DEBUG)
 
     for raw in raw_conditions:
         try:
@@ -190,20 +199,30 @@ def ingest_batch(
 
         if store.add(record):
             metrics.added += 1
-            for flag in record.quality_flags:
-                flag_counts[flag] = flag_counts.get(flag, 0) + 1
-                logger.info("Flag [%s] on %s: %s", flag, record.resource_id, record.display_name)
+            flags = flag_names(record.quality_flags)
+            flag_counts.update(flags)
+            if log_flags:
+                for flag in flags:
+                    logger.debug(
+                        "Flag [%s] on %s: %s", flag, record.resource_id, record.display_name
+                    )
         else:
             metrics.skipped_duplicate += 1
-            logger.warning("Duplicate resource ID skipped: %s", record.resource_id)
+            duplicate_ids.append(record.resource_id)
 
-    metrics.flags = flag_counts
+    if duplicate_ids:
+        logger.warning(
+            "Batch %d skipped %d duplicate resource ID(s): %s",
+            batch_number, len(duplicate_ids), ", ".join(duplicate_ids),
+        )
+
+    metrics.flags = dict(flag_counts)
     dashboard.record_batch(metrics)
 
     logger.info(
         "Batch %d complete: %d received, %d added, %d duplicates, %d errors, flags=%s",
         batch_number, metrics.received, metrics.added,
-        metrics.skipped_duplicate, metrics.errored, flag_counts,
+        metrics.skipped_duplicate, metrics.errored, metrics.flags,
     )
     return metrics
 
@@ -211,7 +230,10 @@ def ingest_batch(
 def split_into_batches(
     all_conditions: list[dict[str, Any]], seed: int = 42
 ) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
-    shuffled = list(all_conditions)
-    random.Random(seed).shuffle(shuffled)
-    mid = len(shuffled) // 2 + len(shuffled) % 2
-    return shuffled[:mid], shuffled[mid:]
+    order = list(range(len(all_conditions)))
+    random.Random(seed).shuffle(order)
+    mid = len(order) // 2 + len(order) % 2
+    return (
+        [all_conditions[i] for i in order[:mid]],
+        [all_conditions[i] for i in order[mid:]],
+    )
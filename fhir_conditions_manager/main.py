@@ -22,6 +22,7 @@ def run_ingestion_simulation(store: ConditionStore, dashboard: MonitoringDashboa
     logger.info("Loaded %d raw conditions", len(all_conditions))
 
     batch_one, batch_two = split_into_batches(all_conditions, seed=42)
+    del all_conditions
     logger.info("Split into batch 1 (%d) and batch 2 (%d)", len(batch_one), len(batch_two))
 
     logger.info("=" * 60)
@@ -3,10 +3,14 @@ from __future__ import annotations
 import logging
 import sys
 import time
+from collections import Counter, deque
 from dataclasses import dataclass, field
 from typing import Any
 
 
+RETRIEVAL_LATENCY_WINDOW = 4096
+
+
 def configure_logging() -> None:
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(
@@ -40,16 +44,28 @@ class MonitoringDashboard:
 
     def __init__(self) -> None:
         self.ingestion_batches: list[BatchMetrics] = []
-        self.quality_flags_total: dict[str, int] = {}
+        self._serialized_batches: list[dict[str, Any]] = []
+        self.quality_flags_total: Counter[str] = Counter()
         self.corrections: list[CorrectionEntry] = []
-        self.retrieval_latency_samples: list[float] = []
+        self.retrieval_latency_samples: deque[float] = deque(maxlen=RETRIEVAL_LATENCY_WINDOW)
+        self._total_received = 0
+        self._total_conditions_removed = 0
+        self._latency_sum = 0.0
 
     def record_batch(self, metrics: BatchMetrics) -> None:
         self.ingestion_batches.append(metrics)
-        for flag_name, count in metrics.flags.items():
-            self.quality_flags_total[flag_name] = (
-                self.quality_flags_total.get(flag_name, 0) + count
-            )
+        self._serialized_batches.append(
+            {
+                "batch": metrics.batch_number,
+                "received": metrics.received,
+                "added": metrics.added,
+                "skipped_duplicate": metrics.skipped_duplicate,
+                "errored": metrics.errored,
+                "flags": metrics.flags,
+            }
+        )
+        self._total_received += metrics.received
+        self.quality_flags_total.update(metrics.flags)
 
     def record_correction(
         self, action: str, target: str, reason: str, records_affected: int
@@ -65,37 +81,28 @@ class MonitoringDashboard:
                 records_affected=records_affected,
             )
         )
+        self._total_conditions_removed += records_affected
 
     def record_retrieval_latency(self, latency_ms: float) -> None:
-        self.retrieval_latency_samples.append(latency_ms)
+        samples = self.retrieval_latency_samples
+        if len(samples) == samples.maxlen:
+            self._latency_sum -= samples[0]
+        samples.append(latency_ms)
+        self._latency_sum += latency_ms
 
     def get_system_status(self, store_active: int, store_removed: int) -> dict[str, Any]:
-        total_loaded = sum(b.received for b in self.ingestion_batches)
-
         avg_latency_ms = 0.0
         if self.retrieval_latency_samples:
-            avg_latency_ms = sum(self.retrieval_latency_samples) / len(
-                self.retrieval_latency_samples
-            )
+            avg_latency_ms = self._latency_sum / len(self.retrieval_latency_samples)
 
         return {
-            "total_conditions_loaded": total_loaded,
+            "total_conditions_loaded": self._total_received,
             "total_active": store_active,
             "total_removed": store_removed,
-            "ingestion_batches": [
-                {
-                    "batch": b.batch_number,
-                    "received": b.received,
-                    "added": b.added,
-                    "skipped_duplicate": b.skipped_duplicate,
-                    "errored": b.errored,
-                    "flags": b.flags,
-                }
-                for b in self.ingestion_batches
-            ],
+            "ingestion_batches": list(self._serialized_batches),
             "quality_flags_total": dict(self.quality_flags_total),
             "corrections_applied": len(self.corrections),
-            "conditions_removed": sum(c.records_affected for c in self.corrections),
+            "conditions_removed": self._total_conditions_removed,
             "avg_retrieval_latency_ms": round(avg_latency_ms, 2),
         }
 
@@ -1,17 +1,61 @@
 from __future__ import annotations
 
+import bisect
+import heapq
+import io
 import logging
 from dataclasses import dataclass, field
-from typing import Optional
-
-from .condition_model import ConditionRecord, QUALITY_FLAG_METADATA
+from operator import attrgetter
+from typing import Optional, Sequence
+
+from .condition_model import (
+    FLAG_BITS,
+    ICD10_LABEL,
+    ICD9_LABEL,
+    IMO_LABEL,
+    QUALITY_FLAG_METADATA,
+    SNOMED_LABEL,
+    ConditionRecord,
+    flag_names,
+)
 from .condition_store import ConditionStore
 from .monitoring import LatencyTracker, MonitoringDashboard
 
 logger = logging.getLogger("fhir_conditions_manager.retrieval")
 
-
-@dataclass
+_by_encounter_count = attrgetter("encounter_count")
+
+_grouping_fields = attrgetter(
+    "canonical_code",
+    "normalized_status",
+    "quality_flags",
+    "derived_from_ids",
+    "onset_start_date",
+    "onset_period",
+    "icd10_codes",
+    "snomed_codes",
+    "icd9_codes",
+    "imo_codes",
+)
+
+_CODE_SYSTEM_FIELDS = {
+    "icd10": attrgetter("icd10_codes"),
+    "icd-10": attrgetter("icd10_codes"),
+    "snomed": attrgetter("snomed_codes"),
+    "icd9": attrgetter("icd9_codes"),
+    "icd-9": attrgetter("icd9_codes"),
+    "imo": attrgetter("imo_codes"),
+}
+
+NOTABLE_FLAG_DESCRIPTIONS: dict[str, str] = {
+    name: meta["description"]
+    for name, meta in QUALITY_FLAG_METADATA.items()
+    if meta["severity"] in ("high", "medium")
+}
+NOTABLE_FLAG_MASK = sum(FLAG_BITS[name] for name in NOTABLE_FLAG_DESCRIPTIONS)
+
+
+@dataclass(slots=True)
 class ConditionGroup:
     canonical_code: str
     code_system_label: str
@@ -21,126 +65,126 @@ class ConditionGroup:
     encounter_count: int = 0
     earliest_onset: Optional[str] = None
     latest_onset: Optional[str] = None
-    quality_flags: set[str] = field(default_factory=set)
+    quality_flags: int = 0
     has_overlapping_dates: bool = False
     consolidated_record_count: int = 0
     derived_from_source_count: int = 0
+    frozen_codes: tuple[tuple[str, tuple[str, ...]], ...] = ()
+    sorted_statuses: tuple[str, ...] = ()
+    notable_flag_descs: tuple[str, ...] = ()
+    _onset_periods: list[tuple[str, str]] = field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+    _finalized: bool = field(default=False, init=False, repr=False, compare=False)
 
 
-def _canonical_code(record: ConditionRecord) -> tuple[str, str]:
-    if record.icd10_codes:
-        return next(iter(record.icd10_codes)), "ICD-10"
-    if record.snomed_codes:
-        return next(iter(record.snomed_codes)), "SNOMED"
-    if record.icd9_codes:
-        return next(iter(record.icd9_codes)), "ICD-9"
-    return record.display_name.lower(), "text"
-
-
-def _code_labels(record: ConditionRecord) -> dict[str, set[str]]:
-    result: dict[str, set[str]] = {}
-    if record.icd10_codes:
-        result["ICD-10"] = set(record.icd10_codes)
-    if record.snomed_codes:
-        result["SNOMED"] = set(record.snomed_codes)
-    if record.icd9_codes:
-        result["ICD-9"] = set(record.icd9_codes)
-    if record.imo_codes:
-        result["IMO"] = set(record.imo_codes)
-    return result
-
-
-def _matches_text(record: ConditionRecord, query: str) -> bool:
-    return query.lower() in record.searchable_text
-
-
-def _matches_code(record: ConditionRecord, code: str, code_system: Optional[str]) -> bool:
-    if code_system:
-        system_map = {
-            "icd10": record.icd10_codes,
-            "icd-10": record.icd10_codes,
-            "snomed": record.snomed_codes,
-            "icd9": record.icd9_codes,
-            "icd-9": record.icd9_codes,
-            "imo": record.imo_codes,
-        }
-        target = system_map.get(code_system.lower())
-        if target is not None:
-            return code in target
-    return code in record.all_codes
-
-
-def _matches_status(record: ConditionRecord, status: str) -> bool:
-    return record.normalized_status == status.lower()
-
-
-def _detect_overlapping_onset_periods(
-    onset_periods: list[tuple[str, str]],
-) -> bool:
-    sorted_periods = sorted(onset_periods, key=lambda p: p[0])
-    for i in range(1, len(sorted_periods)):
-        previous_end = sorted_periods[i - 1][1]
-        current_start = sorted_periods[i][0]
-        if current_start < previous_end:
-            return True
-    return False
-
-
-def group_by_canonical_code(records: list[ConditionRecord]) -> list[ConditionGroup]:
+def _add_onset_period(group: ConditionGroup, start: str, end: str) -> None:
+    if group.has_overlapping_dates:
+        return
+    # Inverted periods are treated as their swapped span. With every period
+    # oriented end >= start, and disjoint until an overlap is seen, sorting by
+    # start also sorts by end, so only the immediate neighbours need checking.
+    if end < start:
+        start, end = end, start
+    periods = group._onset_periods
+    i = bisect.bisect_left(periods, (start, end))
+    if (i > 0 and start < periods[i - 1][1]) or (i < len(periods) and periods[i][0] < end):
+        group.has_overlapping_dates = True
+        periods.clear()
+        return
+    periods.insert(i, (start, end))
+
+
+def group_by_canonical_code(
+    records: Sequence[ConditionRecord], limit: Optional[int] = None
+) -> tuple[list[ConditionGroup], int]:
     groups: dict[str, ConditionGroup] = {}
-    onset_periods_by_group: dict[str, list[tuple[str, str]]] = {}
+    get_fields = _grouping_fields
+    get_group = groups.get
+    add_onset_period = _add_onset_period
 
     for record in records:
-        code, label = _canonical_code(record)
-
-        if code not in groups:
-            groups[code] = ConditionGroup(
+        (
+            (code, label), status, flags, derived_from_ids, onset_date, onset_period,
+            icd10, snomed, icd9, imo,
+        ) = get_fields(record)
+
+        group = get_group(code)
+        if group is None:
+            group = groups[code] = ConditionGroup(
                 canonical_code=code,
                 code_system_label=label,
                 display_name=record.display_name,
-                all_codes=_code_labels(record),
+                all_codes={
+                    ICD10_LABEL: set(), SNOMED_LABEL: set(), ICD9_LABEL: set(), IMO_LABEL: set(),
+                },
             )
-            onset_periods_by_group[code] = []
+        all_codes = group.all_codes
+        if icd10:
+            all_codes[ICD10_LABEL] |= icd10
+        if snomed:
+            all_codes[SNOMED_LABEL] |= snomed
+        if icd9:
+            all_codes[ICD9_LABEL] |= icd9
+        if imo:
+            all_codes[IMO_LABEL] |= imo
 
-        group = groups[code]
         group.encounter_count += 1
-        group.statuses.add(record.normalized_status)
-        group.quality_flags.update(record.quality_flags)
+        group.statuses.add(status)
+        group.quality_flags |= flags
 
-        if record.derived_from_ids:
+        if derived_from_ids:
             group.consolidated_record_count += 1
-            group.derived_from_source_count += len(record.derived_from_ids)
-
-        for sys_label, codes in _code_labels(record).items():
-            group.all_codes.setdefault(sys_label, set()).update(codes)
-
-        if record.onset_start:
-            onset_str = record.onset_start.isoformat()[:10]
-            if group.earliest_onset is None or onset_str < group.earliest_onset:
-                group.earliest_onset = onset_str
-            if group.latest_onset is None or onset_str > group.latest_onset:
-                group.latest_onset = onset_str
-
-        if record.onset_start and record.onset_end:
-            onset_periods_by_group[code].append(
-                (record.onset_start.isoformat(), record.onset_end.isoformat())
-            )
-
-    for code, group in groups.items():
-        periods = onset_periods_by_group[code]
-        if len(periods) >= 2 and _detect_overlapping_onset_periods(periods):
-            group.has_overlapping_dates = True
-
-    return sorted(groups.values(), key=lambda g: g.encounter_count, reverse=True)
+            group.derived_from_source_count += len(derived_from_ids)
+
+        if onset_date:
+            earliest = group.earliest_onset
+            if earliest is None:
+                group.earliest_onset = group.latest_onset = onset_date
+            elif onset_date < earliest:
+                group.earliest_onset = onset_date
+            elif onset_date > group.latest_onset:
+                group.latest_onset = onset_date
+
+        if onset_period:
+            add_onset_period(group, *onset_period)
+
+    if limit is None:
+        ranked = sorted(groups.values(), key=_by_encounter_count, reverse=True)
+    else:
+        ranked = heapq.nlargest(limit, groups.values(), key=_by_encounter_count)
+    for group in ranked:
+        _finalize_group(group)
+
+    return ranked, len(groups)
+
+
+def _finalize_group(group: ConditionGroup) -> None:
+    group.frozen_codes = tuple(
+        (label, tuple(sorted(codes)))
+        for label, codes in sorted(group.all_codes.items())
+        if codes
+    )
+    group.sorted_statuses = tuple(sorted(group.statuses))
+    group.notable_flag_descs = tuple(
+        NOTABLE_FLAG_DESCRIPTIONS[f]
+        for f in flag_names(group.quality_flags & NOTABLE_FLAG_MASK)
+    )
+    group._onset_periods.clear()
+    group._finalized = True
 
 
 def format_group_for_llm(group: ConditionGroup) -> str:
-    code_parts = []
-    for label, codes in sorted(group.all_codes.items()):
-        code_parts.append(f"{label}: {', '.join(sorted(codes))}")
-    code_str = " | ".join(code_parts)
+    buf = io.StringIO()
+    _write_group(buf, group)
+    return buf.getvalue()
 
-    status_str = ", ".join(sorted(group.statuses))
+
+def _write_group(buf: io.StringIO, group: ConditionGroup) -> None:
+    if not group._finalized:
+        _finalize_group(group)
+    code_str = " | ".join(f"{label}: {', '.join(codes)}" for label, codes in group.frozen_codes)
+    status_str = ", ".join(group.sorted_statuses)
 
     date_range = ""
     if group.earliest_onset:
@@ -149,29 +193,20 @@ def format_group_for_llm(group: ConditionGroup) -> str:
         else:
             date_range = f" | {group.earliest_onset}"
 
-    lines = [
-        f"{group.display_name} ({code_str})",
-        f"  Status: {status_str} | {group.encounter_count} encounter(s){date_range}",
-    ]
+    buf.write(f"{group.display_name} ({code_str})\n")
+    buf.write(f"  Status: {status_str} | {group.encounter_count} encounter(s){date_range}")
 
     if group.has_overlapping_dates:
-        lines.append("  Note: overlapping date ranges across encounters")
+        buf.write("\n  Note: overlapping date ranges across encounters")
 
     if group.consolidated_record_count > 0:
-        lines.append(
-            f"  Note: includes {group.consolidated_record_count} consolidated "
+        buf.write(
+            f"\n  Note: includes {group.consolidated_record_count} consolidated "
             f"record(s) derived from {group.derived_from_source_count} source(s)"
         )
 
-    notable_flags = [
-        f for f in group.quality_flags
-        if QUALITY_FLAG_METADATA.get(f, {}).get("severity") in ("high", "medium")
-    ]
-    if notable_flags:
-        descs = [QUALITY_FLAG_METADATA[f]["description"] for f in notable_flags]
-        lines.append(f"  Warning: {'; '.join(descs)}")
-
-    return "\n".join(lines)
+    if group.notable_flag_descs:
+        buf.write(f"\n  Warning: {'; '.join(group.notable_flag_descs)}")
 
 
 def retrieve(
@@ -184,14 +219,12 @@ def retrieve(
     max_results: int = 20,
 ) -> str:
     with LatencyTracker(dashboard):
-        candidates = store.get_all_active()
-
-        if query:
-            candidates = [r for r in candidates if _matches_text(r, query)]
-        if code:
-            candidates = [r for r in candidates if _matches_code(r, code, code_system)]
-        if status:
-            candidates = [r for r in candidates if _matches_status(r, status)]
+        candidates = store.search(text=query, code=code, status=status)
+        system_codes = None
+        if code and code_system:
+            system_codes = _CODE_SYSTEM_FIELDS.get(code_system.lower())
+        if system_codes is not None:
+            candidates = [r for r in candidates if code in system_codes(r)]
 
         if not candidates:
             filters = []
@@ -203,18 +236,23 @@ def retrieve(
                 filters.append(f"status={status}")
             return f"No conditions found matching: {', '.join(filters)}"
 
-        grouped = group_by_canonical_code(candidates)
-        limited = grouped[:max_results]
+        limited, group_count = group_by_canonical_code(candidates, limit=max_results)
 
-        sections = [format_group_for_llm(g) for g in limited]
-        header = f"Found {len(candidates)} record(s) across {len(grouped)} condition(s)"
-        if len(grouped) > max_results:
+        header = f"Found {len(candidates)} record(s) across {group_count} condition(s)"
+        if group_count > max_results:
             header += f" (showing top {max_results})"
         header += f" — {store.active_count} active conditions total"
 
         logger.info(
             "Retrieval: query=%s code=%s status=%s -> %d records, %d groups",
-            query, code, status, len(candidates), len(grouped),
+            query, code, status, len(candidates), group_count,
         )
 
-        return header + "\n\n" + "\n\n".join(sections)
+        buf = io.StringIO()
+        buf.write(header)
+        buf.write("\n\n")
+        for i, group in enumerate(limited):
+            if i:
+                buf.write("\n\n")
+            _write_group(buf, group)
+        return buf.getvalue()